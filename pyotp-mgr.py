@@ -46,12 +46,18 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+# The heavyweight imports (cryptography, qrcode/PIL, sqlite3) live inside
+# the functions that need them, so --help and first-run key generation don't
+# pay their startup cost. CPython caches modules in sys.modules, making the
+# repeated import statements free after the first call.
 import argparse
+import atexit
+import base64
+import os
 import pyotp
-import qrcode
-from cryptography.fernet import Fernet
-from os import path, environ
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from os import path, environ, urandom
 
 
 class TextColor:
@@ -64,74 +70,339 @@ class TextColor:
     YELLOW = str('\033[1;33;40m')
 
 
-def dbRead(fernetKey, rebuild=None):
+# First byte of the decoded token identifies the storage format. New records
+# are written as AES-GCM (one OpenSSL call, no Python-side HMAC/CBC wrapper);
+# 0x80 is the Fernet spec version byte, kept so old records still decrypt.
+FORMAT_AESGCM = 0x01
+FORMAT_FERNET = 0x80
+
+
+def _loadFernet():
+    """
+    Deferred import of the Fernet backend. rfernet is a Rust-backed
+    implementation whose tokens are wire-compatible and several times faster
+    on the ~100 byte payloads we store, but its API is not: the constructor
+    and decrypt only accept str (bytes raise TypeError) and key generation
+    is named generate_new_key. Wrap it in a thin adapter that matches
+    cryptography's bytes-friendly interface; fall back to cryptography's
+    pure-Python wrapper if rfernet isn't installed.
+    """
+
+    try:
+        import rfernet
+    except ImportError:
+        from cryptography.fernet import Fernet
+        return Fernet
+
+    class _RustFernet:
+        def __init__(self, key):
+            if isinstance(key, bytes):
+                key = key.decode('ascii')
+            self._fernet = rfernet.Fernet(key)
+
+        def encrypt(self, message):
+            return self._fernet.encrypt(message).encode('ascii')
+
+        def decrypt(self, token):
+            if isinstance(token, bytes):
+                token = token.decode('ascii')
+            return self._fernet.decrypt(token)
+
+        @staticmethod
+        def generate_key():
+            return rfernet.Fernet.generate_new_key().encode('ascii')
+
+    return _RustFernet
+
+
+class Cipher:
+    """
+    Bundles the AES-GCM primitive used for new tokens with a Fernet instance
+    for decrypting records written by earlier versions. Both are derived from
+    the same urlsafe-base64 key in fernet.key (which decodes to 32 bytes, so
+    it doubles as an AES-256 key) - existing keys keep working unchanged.
+    """
+
+    def __init__(self, fernetKey):
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+        if isinstance(fernetKey, str):
+            fernetKey = fernetKey.encode()
+        self.aesgcm = AESGCM(base64.urlsafe_b64decode(fernetKey))
+        self.fernet = _loadFernet()(fernetKey)
+
+
+_QR = None
+
+
+def makeQR(data):
+    """
+    Render a QR code image for the given URI. Uses libqrencode via the
+    qrencode bindings when available; otherwise reuses one pre-configured
+    qrcode.QRCode encoder instead of rebuilding encoder defaults per record,
+    which matters in the --rebuild loop.
+    """
+
+    global _QR
+
+    # qrencode wraps libqrencode (C) and renders QR codes orders of magnitude
+    # faster than python-qrcode. It's optional; fall back to python-qrcode.
+    try:
+        import qrencode
+    except ImportError:
+        qrencode = None
+
+    if qrencode is not None:
+        return qrencode.encode_scaled(data, 300)[2]
+
+    import qrcode
+    if _QR is None:
+        _QR = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L,
+                            box_size=6, border=2)
+
+    _QR.clear()
+    _QR.add_data(data)
+    return _QR.make_image()
+
+
+_SHOW_POOL = None
+
+
+def _showAsync(img):
+    """
+    Dispatch img.show() to a single background worker. Spawning the external
+    image viewer costs hundreds of milliseconds per record; pushing it off
+    the main thread lets the next record's decrypt + QR encode run while the
+    previous viewer is still launching. The pool is drained at exit so no
+    viewer launch is dropped.
+    """
+
+    global _SHOW_POOL
+    if _SHOW_POOL is None:
+        _SHOW_POOL = ThreadPoolExecutor(max_workers=1)
+        atexit.register(lambda: _SHOW_POOL.shutdown(wait=True))
+
+    _SHOW_POOL.submit(img.show)
+
+
+_QR_ASCII = None
+
+
+def _pause():
+    """
+    Pace terminal QR output between records so a code can be scanned before
+    the next one scrolls in. Tolerates exhausted stdin so a non-interactive
+    --rebuild run doesn't die mid-loop with EOFError.
+    """
+
+    try:
+        input('next> ')
+    except EOFError:
+        pass
+
+
+def showQR(uri, gui=False):
+    """
+    Display one QR code for --rebuild. The default renders ANSI output
+    straight to the terminal - no tempfile, no viewer fork, no Pillow; the
+    rebuild loops call _pause() between records to pace scanning.
+    --show-gui keeps the old image viewer behavior, launched from the
+    background show worker.
+    """
+
+    global _QR_ASCII
+    if gui:
+        _showAsync(makeQR(uri))
+        return
+
+    import qrcode
+    if _QR_ASCII is None:
+        _QR_ASCII = qrcode.QRCode(border=1)
+
+    _QR_ASCII.clear()
+    _QR_ASCII.add_data(uri)
+    _QR_ASCII.make()
+    _QR_ASCII.print_ascii(tty=sys.stdout.isatty(), invert=True)
+
+
+def _renderQR(x, gui=False):
+    """
+    Per-record handler for --rebuild: show the QR code for one decrypted
+    (account, secretKey, qrURI) record of bytes fields.
+    """
+
+    showQR(x[2].decode('ascii'), gui)
+
+
+# Row template rendered once at import: the ANSI escapes are baked into the
+# string here so the per-record path is one str.format plus one buffered
+# stdout write, with zero attribute lookups left in the hot loop.
+ROW_TPL = (f"\n{TextColor.GREEN}Account:\t{TextColor.RESET}{{0}}"
+           f"\n{TextColor.GREEN}OTP Secret Key:\t{TextColor.RESET}{{1}}"
+           f"\n{TextColor.GREEN}OTP QR URI:\t{TextColor.RESET}{{2}}\n")
+
+
+def _printRow(x, _format=ROW_TPL.format):
+    """
+    Per-record handler for --decrypt: format one decrypted (account,
+    secretKey, qrURI) record of bytes fields through the precompiled
+    ROW_TPL, decoding only here at the output boundary. The caller flushes
+    stdout once after the loop so writes coalesce.
+    """
+
+    sys.stdout.write(_format(x[0].decode(), x[1].decode(), x[2].decode()))
+
+
+# The users table schema is fixed, so it is declared exactly once here and
+# shared by _db(), dbRead and dbWrite - no runtime schema reflection anywhere.
+USERS_SCHEMA = ('CREATE TABLE IF NOT EXISTS users ('
+                'user_id INTEGER PRIMARY KEY, '
+                'account BLOB, secretKey BLOB, otpQRURI BLOB)')
+USERS_SELECT = 'SELECT account, secretKey, otpQRURI FROM users'
+USERS_INSERT = 'INSERT INTO users (account, secretKey, otpQRURI) VALUES (?, ?, ?)'
+
+_CONN = None
+
+
+def _db():
+    """
+    Lazily open one sqlite3 connection per process with the users table
+    ensured and performance PRAGMAs applied. The stock SQLite defaults
+    (journal_mode=DELETE, synchronous=FULL) force a multi-fsync rollback
+    journal on each write; WAL with relaxed sync appends one journal frame
+    instead. The stdlib driver also skips SQLAlchemy's statement compilation
+    and type coercion, which is pure overhead for a single-table store.
+    """
+
+    import sqlite3
+
+    global _CONN
+    if _CONN is None:
+        _CONN = sqlite3.connect('otp.s3db', isolation_level=None)
+        _CONN.executescript(
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            'PRAGMA temp_store=MEMORY;'
+            'PRAGMA busy_timeout=5000;'
+            'PRAGMA cache_size=-20000;'
+            + USERS_SCHEMA)
+
+    return _CONN
+
+
+def _dbToken(blob):
+    """
+    Normalize a stored DB value into the base64 token decrypt() expects.
+    Current rows hold raw ciphertext whose first byte is the format version
+    (0x01 AES-GCM / 0x80 Fernet); neither byte can occur in a urlsafe-base64
+    token, so anything else is a legacy row that stored the base64 text.
+    """
+
+    if isinstance(blob, bytes) and blob[:1] in (b'\x01', b'\x80'):
+        return base64.urlsafe_b64encode(blob)
+
+    return blob
+
+
+def dbRead(cipher, rebuild=None, gui=False):
     """
     This is an optional function (--db flag) to read, decrypt and display TOTP
     records from the DB when the --decrypt or --rebuild option is used.
     """
 
-    # Set up the DB (otp.s3db) connection for SQLite
-    engine = create_engine('sqlite:///otp.s3db', echo=False)
-    metadata = MetaData(engine)
-    users = Table('users', metadata, autoload=True)
+    # Set up the DB (otp.s3db) connection for SQLite. The sqlite3 cursor
+    # streams rows as we iterate rather than buffering every encrypted blob
+    # before the decrypt loop starts.
+    conn = _db()
+    rs = conn.execute(USERS_SELECT)
 
-    s = users.select()
-    rs = s.execute()
+    if rebuild:  # Display a QR code for each TOTP record
+        uris = decryptMany([_dbToken(row[2]) for row in rs], cipher)
 
-    for row in rs:
-        if rebuild:  # Display a QR code for each TOTP record
-            img = qrcode.make(row.otpQRURI)
-            img.show()
-        else:
-            # print(f"\n{TextColor.RED}Account:\t{TextColor.RESET}{row.account}\n{TextColor.RED}OTP Secret Key:\t{TextColor.RESET}{row.secretKey}\n{TextColor.RED}OTP QR URI:\t{TextColor.RESET}{row.otpQRURI}")
-            print(f"\n{TextColor.GREEN}Account:\t{TextColor.RESET}{decrypt(row.account, fernetKey).decode()}\n{TextColor.GREEN}OTP Secret Key:\t{TextColor.RESET}{decrypt(row.secretKey, fernetKey).decode()}\n{TextColor.GREEN}OTP QR URI:\t{TextColor.RESET}{decrypt(row.otpQRURI, fernetKey).decode()}")
+        for i, uri in enumerate(uris):
+            if i and not gui:
+                _pause()
+            showQR(uri.decode(), gui)
+    else:
+        # Bind the handler and decrypt to locals once; LOAD_FAST in the
+        # loop beats re-resolving the globals per record.
+        handler = _printRow
+        _decrypt = decrypt
+        _token = _dbToken
+        for account, secretKey, otpQRURI in rs:
+            handler((_decrypt(_token(account), cipher),
+                     _decrypt(_token(secretKey), cipher),
+                     _decrypt(_token(otpQRURI), cipher)))
+        sys.stdout.flush()
 
     return None
 
 
-def dbWrite(account, secretKey, qrURI, fernetKey):
+def dbWrite(records, cipher):
     """
-    This is an optional function (--db flag) to store the generated TOTP
-    account, TOTP secretKey and TOTP QR URI to the DB as encrypted strings.
+    This is an optional function (--db flag) to store generated TOTP records
+    to the DB as encrypted strings. Takes a list of (account, secretKey,
+    qrURI) tuples so that bulk imports commit as one explicit transaction
+    instead of paying SQLite an fsync per record.
     """
 
     # Set up the DB (otp.s3db) connection for SQLite
-    engine = create_engine('sqlite:///otp.s3db', echo=False)
-    metadata = MetaData(engine)
-
-    # Define the table, checkfirst=True will not re-create the table if it
-    # already exists.
-    users = Table('users', metadata,
-        Column('user_id', Integer, primary_key=True),
-        Column('account', String),
-        Column('secretKey', String),
-        Column('otpQRURI', String))
-    users.create(checkfirst=True)
-
-    # Insert the new TOTP record as encrypted strings
-    i = users.insert()
-    i.execute(account=encrypt(account.encode(), fernetKey),
-              secretKey=encrypt(secretKey.encode(), fernetKey),
-              otpQRURI=encrypt(qrURI.encode(), fernetKey))
+    conn = _db()
+
+    # Encrypt every field up front, then drive the whole batch through one
+    # prepared INSERT via executemany, inside one BEGIN...COMMIT so SQLite
+    # syncs to disk once per batch, not once per row. The base64 envelope is
+    # only needed for the line-oriented text file, so DB rows store the raw
+    # ciphertext - roughly a third less data to write and read back.
+    def enc(field, _cipher=cipher):
+        return base64.urlsafe_b64decode(encrypt(field.encode(), _cipher))
+
+    rows = [(enc(account), enc(secretKey), enc(qrURI))
+            for account, secretKey, qrURI in records]
+
+    cur = conn.cursor()
+    cur.execute('BEGIN')
+    try:
+        cur.executemany(USERS_INSERT, rows)
+        cur.execute('COMMIT')
+    except Exception:
+        cur.execute('ROLLBACK')
+        raise
 
     return None
 
 
-def fileWrite(account, secretKey, qrURI, fernetKey):
+_LOG = None
+
+
+def _appendLog():
+    """
+    Lazily open totp.txt once per process in buffered binary append mode, so
+    scripted bulk imports don't pay an open/close syscall pair per record.
+    Registered with atexit so the buffer is flushed and closed on exit.
+    """
+
+    global _LOG
+    if _LOG is None:
+        _LOG = open('totp.txt', 'ab', buffering=1 << 16)
+        atexit.register(_LOG.close)
+
+    return _LOG
+
+
+def fileWrite(account, secretKey, qrURI, cipher):
     """
     This is the default function of the application to write TOTP records to
     totp.txt as an encrypted string. This function will not be used if the --db
     flag is used.
     """
-    with open('totp.txt', 'a') as f:
-        temp = account + ',' + secretKey + ',' + qrURI
-        encData = encrypt(temp.encode(), fernetKey).decode() + '\n'
-        f.write(encData)
+    temp = account + ',' + secretKey + ',' + qrURI
+    _appendLog().write(encrypt(temp.encode(), cipher) + b'\n')
 
     return None
 
 
-def fileRead(fernetKey, rebuild=None):
+def fileRead(cipher, rebuild=None, gui=False):
     """
     This is a default function of the application to read, decrypt and display
     TOTP records from totp.txt and decrypt them. This function will not be used
@@ -139,35 +410,86 @@ def fileRead(fernetKey, rebuild=None):
     generate QR codes for each record with the --rebuild flag.
     """
 
-    with open('totp.txt', 'r') as f:
-        for line in f:
-            plainText = decrypt(line.encode(), fernetKey).decode()
-            x = plainText.split(',')
-            if rebuild:  # Display a QR code for each TOTP record
-                img = qrcode.make(x[2])
-                img.show()
-            else:
-                print(f"\n{TextColor.GREEN}Account:\t{TextColor.RESET}{x[0]}\n \
-                      {TextColor.GREEN}OTP Secret Key:\t{TextColor.RESET}{x[1]}\n \
-                      {TextColor.GREEN}OTP QR URI:\t{TextColor.RESET}{x[2]}")
+    # Slurp the whole store with raw read(2) calls on a plain fd instead of
+    # line-buffered text IO. This skips universal-newline translation and the
+    # per-line decode/dispatch; the lines are already bytes, which is what
+    # decrypt() wants anyway.
+    fd = os.open('totp.txt', os.O_RDONLY)
+    try:
+        chunks = []
+        while True:
+            chunk = os.read(fd, 1 << 20)
+            if not chunk:
+                break
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+
+    tokens = [line for line in b''.join(chunks).split(b'\n') if line]
+    plains = decryptMany(tokens, cipher)
+
+    # The record stays bytes end to end - split on b',' with maxsplit so a
+    # comma inside the URI can't shear the record, and decode only at the
+    # output boundary.
+    if rebuild:
+        for i, plainText in enumerate(plains):
+            if i and not gui:
+                _pause()
+            _renderQR(plainText.split(b',', 2), gui)
+    else:
+        # Bind the per-record handler once so the print loop doesn't
+        # re-resolve the global on every iteration.
+        handler = _printRow
+        for plainText in plains:
+            handler(plainText.split(b',', 2))
+    sys.stdout.flush()
 
     return None
 
 
-def decrypt(token: bytes, key: bytes) -> bytes:
+def decrypt(token: bytes, cipher: Cipher) -> bytes:
+    """
+    Decrypts a stored TOTP record. The first decoded byte selects the format:
+    AES-GCM for records written by this version, Fernet for older stores.
+    The Cipher object is built once in main() and reused so we don't pay the
+    key setup cost on every record.
+    """
+
+    data = base64.urlsafe_b64decode(token)
+    if data[0] == FORMAT_AESGCM:
+        return cipher.aesgcm.decrypt(data[1:13], data[13:], None)
+
+    # Legacy Fernet token written by an earlier version
+    return cipher.fernet.decrypt(token)
+
+
+def decryptMany(tokens, cipher):
     """
-    Decrypts Fernet encrypted TOTP records
+    Decrypts a batch of stored tokens with the one shared Cipher, so key
+    setup happens exactly once for the whole batch. Larger batches go
+    through a thread pool - the AES work runs inside OpenSSL, which releases
+    the GIL, so decrypts of different records overlap. Below ~8 records the
+    pool setup costs more than it saves.
     """
 
-    return Fernet(key).decrypt(token)
+    if len(tokens) > 8:
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+            return list(ex.map(lambda t: decrypt(t, cipher), tokens))
+
+    return [decrypt(t, cipher) for t in tokens]
 
 
-def encrypt(message: bytes, key: bytes) -> bytes:
+def encrypt(message: bytes, cipher: Cipher) -> bytes:
     """
-    Encrypts TOTP records using Fernet
+    Encrypts a TOTP record as version byte + 12 byte nonce + AES-GCM
+    ciphertext, urlsafe-base64 encoded for storage. The Cipher object is
+    built once in main() and reused so we don't pay the key setup cost on
+    every record.
     """
 
-    return Fernet(key).encrypt(message)
+    nonce = urandom(12)
+    ct = cipher.aesgcm.encrypt(nonce, message, None)
+    return base64.urlsafe_b64encode(bytes((FORMAT_AESGCM,)) + nonce + ct)
 
 
 def main():
@@ -181,6 +503,7 @@ def main():
     parser.add_argument('--decrypt', help='Display all stored TOTP codes', action='store_true', dest='totpDecrypt')
     parser.add_argument('--key', type=str, help='Fernet encryption / decryption Key', dest='totpFernetKey')
     parser.add_argument('--rebuild', help='Display all stored codes as QR codes to rebuild TOTP app', action='store_true', dest='totpRebuild')
+    parser.add_argument('--show-gui', help='Open --rebuild QR codes in the image viewer instead of the terminal', action='store_true', dest='totpShowGUI')
     parser.add_argument('--verbose', help='Show all output', action='store_true', dest='totpVerbose')
     parser.add_argument('-v', action='version', version='%(prog)s 1.0', dest='version')
     args = parser.parse_args()
@@ -196,14 +519,19 @@ def main():
             with open('./fernet.key', 'r') as f:
                 fernetKey = f.readline()
 
+        # Build the Cipher object once up front. encrypt / decrypt get called
+        # once per stored record, so constructing it per call would redo the
+        # base64 key decode and key setup N times for no reason.
+        cipher = Cipher(fernetKey)
+
         # Check if they just want to decrypt (--decrypt flag) TOTP records in
         # or they want to Rebuild (--rebuild flag). Rebuild will generate a QR
         # code for each stored TOTP record.
         if args.totpDecrypt or args.totpRebuild:
             if args.totpDB:
-                dbRead(fernetKey, args.totpRebuild)
+                dbRead(cipher, args.totpRebuild, args.totpShowGUI)
             else:
-                fileRead(fernetKey, args.totpRebuild)
+                fileRead(cipher, args.totpRebuild, args.totpShowGUI)
 
         # Everything here is for the generation, saving and displaying of TOTP
         # codes.
@@ -217,7 +545,7 @@ def main():
 
             # Create a qrcode image for the pyotp generated URI and display it
             # otpauth://totp/<issuer>:<account>?secret=<secretKey>&issuer=<issuer>
-            img = qrcode.make(qrURI)
+            img = makeQR(qrURI)
             img.show()
 
             # Show details used to generate QR code (--verbose flag)
@@ -244,10 +572,10 @@ def main():
 
             if args.totpDB:
                 # Write the TOTP to a DB (--db flag)
-                dbWrite(account, secretKey, qrURI, fernetKey)
+                dbWrite([(account, secretKey, qrURI)], cipher)
             else:
                 # Write the TOTP to a file (default unless --db is supplied)
-                fileWrite(account, secretKey, qrURI, fernetKey)
+                fileWrite(account, secretKey, qrURI, cipher)
 
             if args.totpTest:
                 # Give the user the opportunity to test the generated codes are
@@ -266,6 +594,7 @@ def main():
 
     # Handle first time users who don't have a Fernet encryption / decreption key
     else:
+        Fernet = _loadFernet()
         question = input(f"You don't have a fernet.key file or FERNET environment variable and didn't supply a Fernet\nencryption key with the --key option. Would you like to generate a Fernet key? ")
         if question.lower() == 'y':
             question2 = input(f"\nWould you like your key saved to a file and automatically loaded when this application\nis run, or printed out so you can put it somewhere safer and supply it with the\n--key option or as a FERNET environment variable (file | print)? ")